@@ -5,3 +5,5 @@ from . import chat_agent
 from . import model_logic
 from . import utils
 from . import repo_loader
+from . import vector_store
+from . import onnx_encoder
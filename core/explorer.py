@@ -1,23 +1,109 @@
 import os
 import datetime
+import functools
 import chromadb
-from pathlib import Path
+import numpy as np
+import torch
 from sentence_transformers import SentenceTransformer
 import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
 from . import repo_loader
+from . import vector_store
+from . import onnx_encoder
+
+EXCLUDE_DIRS = {'.git', '__pycache__', '.vscode', 'node_modules', '.idea', 'chroma_db'}
+
+# Static document fragments, hoisted so the hot indexing loops only concatenate.
+FILE_PREFIX = "Type: File. Path: "
+FOLDER_PREFIX = "Type: Folder. Path: "
+TREE_SEP = ". Tree: "
+SNIP_SEP = ". Content Snippet: "
 
 class SemanticExplorer:
     def __init__(self, db_path="./chroma_db", collection_name="filesystem_index"):
         print("Initializing SemanticExplorer...")
-        self.model = SentenceTransformer('all-MiniLM-L6-v2')
-        self.client = chromadb.PersistentClient(path=db_path)
+        device = 'cuda' if torch.cuda.is_available() else 'cpu'
+        self.model = SentenceTransformer('all-MiniLM-L6-v2', device=device)
+        self._compiled = False
+        if device == 'cuda':
+            # FP16 halves memory traffic with no measurable quality loss here.
+            self.model.half()
+            torch.set_float32_matmul_precision('high')
+            try:
+                self.model[0].auto_model = torch.compile(
+                    self.model[0].auto_model, mode='reduce-overhead', fullgraph=False
+                )
+                self._compiled = True
+            except Exception as e:
+                print(f"torch.compile unavailable, running eager: {e}")
+        self._encode_batch_size = 256 if device == 'cuda' else 32
+        chroma_url = os.getenv("SMARTREPO_CHROMA_URL")
+        if chroma_url:
+            parsed = urllib.parse.urlparse(chroma_url)
+            self.client = chromadb.HttpClient(host=parsed.hostname or chroma_url, port=parsed.port or 8000)
+            print(f"Using Chroma server at {chroma_url}.")
+        else:
+            self.client = chromadb.PersistentClient(path=db_path)
         self.collection = self.client.get_or_create_collection(
             name=collection_name,
-            metadata={"hnsw:space": "cosine"}
+            metadata={"hnsw:space": "ip"}
         )
+        self.vectors = vector_store.Int8VectorStore(db_path)
+        self.blob_cache = vector_store.RepoBlobCache(db_path)
+        self.query_encoder = None
+        if onnx_encoder.ONNX_AVAILABLE and os.getenv("SMARTREPO_ONNX", "1") != "0":
+            try:
+                self.query_encoder = onnx_encoder.OnnxEncoder(cache_dir=db_path)
+                print("Using ONNX Runtime int8 encoder for queries.")
+            except Exception as e:
+                print(f"ONNX query encoder unavailable ({e}). Falling back to SentenceTransformer.")
+        # Per-instance cache so repeat queries (common while typing) skip the encoder.
+        self._encode_query = functools.lru_cache(maxsize=1024)(self._encode_query)
+        # Single writer thread so batch upserts overlap the next batch's encoding.
+        self._writer = ThreadPoolExecutor(max_workers=1)
+        self._pending_write = None
         print("SemanticExplorer initialized.")
         self.is_cancelled = False
 
+    def _encode_query(self, query: str) -> tuple:
+        """Encodes a single query; returns a tuple so results are cacheable."""
+        if self.query_encoder is not None:
+            return tuple(self.query_encoder.encode([query])[0].tolist())
+        with torch.inference_mode():
+            return tuple(self.model.encode([query], normalize_embeddings=True)[0].tolist())
+
+    def _encode_docs(self, docs: list) -> list:
+        """Encodes a whole batch of documents in one model pass."""
+        # With a compiled model, a short final batch would trigger a fresh
+        # graph capture; pad it to the fixed batch size and trim afterwards.
+        pad = 0
+        if self._compiled and len(docs) % self._encode_batch_size:
+            pad = self._encode_batch_size - len(docs) % self._encode_batch_size
+        with torch.inference_mode():
+            embs = self.model.encode(docs + [docs[-1]] * pad, batch_size=self._encode_batch_size,
+                                     convert_to_numpy=True, normalize_embeddings=True,
+                                     show_progress_bar=False)
+        if pad:
+            embs = embs[:len(docs)]
+        return embs.tolist()
+
+    def _upsert_batch(self, docs: list, metadatas: list, ids: list, embeddings=None) -> list:
+        if embeddings is None:
+            embeddings = self._encode_docs(docs)
+        if self._pending_write is not None:
+            self._pending_write.result()  # keep at most one batch in flight
+        self._pending_write = self._writer.submit(self._write_batch, docs, embeddings, metadatas, ids)
+        return embeddings
+
+    def _write_batch(self, docs: list, embeddings: list, metadatas: list, ids: list):
+        self.collection.upsert(documents=docs, embeddings=embeddings, metadatas=metadatas, ids=ids)
+        self.vectors.add(ids, embeddings)
+
+    def _drain_writes(self):
+        if self._pending_write is not None:
+            self._pending_write.result()
+            self._pending_write = None
+
     def get_status(self) -> str:
         count = self.collection.count()
         if count > 0:
@@ -25,12 +111,15 @@ class SemanticExplorer:
         return "Index is empty. Build the index to get started."
 
     def _get_file_snippet(self, path, max_len=500) -> str:
+        # Known-binary extensions never yield a useful snippet; skip the open.
+        if os.path.splitext(path)[1].lower() in repo_loader.EXCLUDE_EXTENSIONS:
+            return ""
         try:
-            with open(path, 'r', encoding='utf-8', errors='ignore') as f:
-                # Basic check for binary files
-                if '\x00' in f.read(1024): return ""
-                f.seek(0)
-                return f.read(max_len)
+            with open(path, 'rb') as f:
+                buf = f.read(512)
+            # Basic check for binary files
+            if b'\x00' in buf[:256]: return ""
+            return buf.decode('utf-8', errors='ignore')[:max_len]
         except Exception:
             return ""
 
@@ -59,44 +148,69 @@ class SemanticExplorer:
         if progress_callback: progress_callback(0.05, desc=f"Found {total_files} files to process.")
         yield f"Found {total_files} files to process."
 
+        session = repo_loader.get_session()
+
+        def fetch(file_meta):
+            # Correctly join URL parts, ensuring the path is properly encoded
+            file_url = urllib.parse.urljoin(content_base_url, urllib.parse.quote(file_meta['path']))
+            unique_id = f"repo::{repo_url}::{file_meta['path']}"
+            sha = file_meta.get('sha')
+            if sha:
+                cached = self.blob_cache.get(unique_id, sha)
+                if cached is not None:
+                    return file_meta, file_url, unique_id, cached, None, None
+            content, err = repo_loader.get_remote_file_content(file_url, session=session)
+            return file_meta, file_url, unique_id, None, content, err
+
         batch_size = 50
-        for i in range(0, total_files, batch_size):
-            if self.is_cancelled: break
-            
-            progress_fraction = (i / total_files) * 0.95 + 0.05 # Scale progress from 5% to 100%
-            status_message = f"Processing batch {i//batch_size + 1}... ({min(i+batch_size, total_files)}/{total_files})"
-            if progress_callback: progress_callback(progress_fraction, desc=status_message)
-            yield status_message
+        meta_template = {"is_dir": False, "source_type": "repository", "repo_url": repo_url}
+        with ThreadPoolExecutor(max_workers=32) as executor:
+            for i in range(0, total_files, batch_size):
+                if self.is_cancelled: break
 
-            batch_files = files[i:i+batch_size]
-            docs, metadatas, ids = [], [], []
+                progress_fraction = (i / total_files) * 0.95 + 0.05 # Scale progress from 5% to 100%
+                status_message = f"Processing batch {i//batch_size + 1}... ({min(i+batch_size, total_files)}/{total_files})"
+                if progress_callback: progress_callback(progress_fraction, desc=status_message)
+                yield status_message
 
-            for file_meta in batch_files:
-                file_path = file_meta['path']
-                # Correctly join URL parts, ensuring file_path is properly encoded
-                file_url = urllib.parse.urljoin(content_base_url, urllib.parse.quote(file_path))
-                
-                content, err = repo_loader.get_remote_file_content(file_url)
-                if err:
-                    print(f"Skipping {file_path}: {err}")
-                    continue
-                
-                snippet = content[:500]
-                doc = f"Type: File. Path: {file_path.replace('/', ' ')}. Tree: {' > '.join(Path(file_path).parts)}. Content Snippet: {snippet}"
-                unique_id = f"repo::{repo_url}::{file_path}"
-                
-                docs.append(doc)
-                metadatas.append({
-                    "full_path": file_url, "relative_path": file_path, "is_dir": False,
-                    "size_bytes": file_meta.get('size', len(content)),
-                    "modified_time": datetime.datetime.now().timestamp(), # No reliable modified time from API
-                    "source_type": "repository", "repo_url": repo_url
-                })
-                ids.append(unique_id)
+                batch_files = files[i:i+batch_size]
+                docs, metadatas, ids, shas = [], [], [], []
+                cached_docs, cached_embs, cached_metadatas, cached_ids = [], [], [], []
+                now_ts = datetime.datetime.now().timestamp() # No reliable modified time from API
 
-            if docs:
-                self.collection.upsert(documents=docs, metadatas=metadatas, ids=ids)
+                for file_meta, file_url, unique_id, cached, content, err in executor.map(fetch, batch_files):
+                    file_path = file_meta['path']
+                    if cached is None and err:
+                        print(f"Skipping {file_path}: {err}")
+                        continue
 
+                    metadata = dict(meta_template, full_path=file_url, relative_path=file_path,
+                                    size_bytes=file_meta.get('size') or len(content or ''),
+                                    modified_time=now_ts)
+
+                    if cached is not None:
+                        doc, emb = cached
+                        cached_docs.append(doc)
+                        cached_embs.append(emb)
+                        cached_metadatas.append(metadata)
+                        cached_ids.append(unique_id)
+                        continue
+
+                    snippet = content[:500]
+                    doc = FILE_PREFIX + file_path.replace('/', ' ') + TREE_SEP + file_path.replace('/', ' > ') + SNIP_SEP + snippet
+
+                    docs.append(doc)
+                    metadatas.append(metadata)
+                    ids.append(unique_id)
+                    shas.append(file_meta.get('sha'))
+
+                if docs:
+                    embeddings = self._upsert_batch(docs, metadatas, ids)
+                    self.blob_cache.put(ids, shas, docs, embeddings)
+                if cached_docs:
+                    self._upsert_batch(cached_docs, cached_metadatas, cached_ids, embeddings=cached_embs)
+
+        self._drain_writes()
         final_count = self.collection.count()
         if self.is_cancelled:
             yield f"Build cancelled. The database now contains {final_count} items."
@@ -104,6 +218,31 @@ class SemanticExplorer:
             if progress_callback: progress_callback(1, desc="Complete!")
             yield f"Index build complete. The database now contains {final_count} items."
 
+    def _scan_tree(self, root_path: str):
+        """
+        Walks the tree with os.scandir, yielding (path, is_dir, stat) tuples.
+        DirEntry caches stat info from the directory read on most platforms,
+        so this avoids the extra os.stat/os.path.isdir syscall per entry that
+        os.walk-based scanning needs.
+        """
+        stack = [root_path]
+        while stack:
+            if self.is_cancelled: return
+            try:
+                with os.scandir(stack.pop()) as it:
+                    for entry in it:
+                        try:
+                            is_dir = entry.is_dir(follow_symlinks=False)
+                            if is_dir and entry.name in EXCLUDE_DIRS:
+                                continue
+                            yield entry.path, is_dir, entry.stat(follow_symlinks=False)
+                            if is_dir:
+                                stack.append(entry.path)
+                        except OSError:
+                            continue
+            except (PermissionError, FileNotFoundError):
+                continue
+
     def _index_local_directory(self, root_path: str, progress_callback=None):
         if not os.path.isdir(root_path):
             yield "Error: Provided path is not a valid directory."
@@ -111,12 +250,7 @@ class SemanticExplorer:
         if progress_callback:
             progress_callback(0, desc="Scanning directories...")
         yield "Scanning directories..."
-        all_paths = []
-        for root, dirs, files in os.walk(root_path):
-            if self.is_cancelled: break
-            dirs[:] = [d for d in dirs if d not in ['.git', '__pycache__', '.vscode', 'node_modules', '.idea', 'chroma_db']]
-            for name in files + dirs:
-                all_paths.append(os.path.join(root, name))
+        all_paths = list(self._scan_tree(root_path))
         if self.is_cancelled:
             yield f"Build cancelled. DB size: {self.collection.count()}"
             return
@@ -124,6 +258,9 @@ class SemanticExplorer:
         if progress_callback:
             progress_callback(0.05, desc=f"Scan complete. Found {total_paths} items.")
         yield f"Scan complete. Found {total_paths} items to process."
+        # Every scanned path starts with root_path, so a slice replaces the
+        # much costlier os.path.relpath call per row.
+        prefix_len = len(os.path.join(root_path, ''))
         batch_size = 128
         for i in range(0, total_paths, batch_size):
             if self.is_cancelled: break
@@ -133,26 +270,36 @@ class SemanticExplorer:
                 progress_callback(progress_fraction, desc=status_message)
             yield status_message
             batch_paths = all_paths[i:i+batch_size]
+            # One metadata fetch per batch lets unchanged files (same mtime
+            # and size as last index) skip snippet reads and re-embedding.
+            existing = {}
+            try:
+                got = self.collection.get(ids=[f"local::{p}" for p, _, _ in batch_paths], include=['metadatas'])
+                existing = dict(zip(got['ids'], got['metadatas']))
+            except Exception:
+                pass
             docs, metadatas, ids = [], [], []
-            for path_str in batch_paths:
-                try:
-                    stat = os.stat(path_str)
-                    is_dir = os.path.isdir(path_str)
-                    relative_path = os.path.relpath(path_str, root_path)
-                    doc = f"Type: {'Folder' if is_dir else 'File'}. Path: {relative_path.replace(os.sep, ' ')}. Tree: {' > '.join(Path(relative_path).parts)}. "
-                    if not is_dir: doc += f"Content Snippet: {self._get_file_snippet(path_str)}"
-                    docs.append(doc)
-                    metadatas.append({
-                        "full_path": path_str, "relative_path": relative_path, "is_dir": is_dir,
-                        "size_bytes": stat.st_size, "modified_time": stat.st_mtime,
-                        "source_type": "local"
-                    })
-                    unique_id = f"local::{path_str}"
-                    ids.append(unique_id)
-                except FileNotFoundError:
+            for path_str, is_dir, stat in batch_paths:
+                prev = existing.get(f"local::{path_str}")
+                if prev and prev.get('modified_time') == stat.st_mtime and prev.get('size_bytes') == stat.st_size:
                     continue
+                relative_path = path_str[prefix_len:]
+                rel_spaces = relative_path.replace(os.sep, ' ')
+                tree = relative_path.replace(os.sep, ' > ')
+                if is_dir:
+                    doc = FOLDER_PREFIX + rel_spaces + TREE_SEP + tree + ". "
+                else:
+                    doc = FILE_PREFIX + rel_spaces + TREE_SEP + tree + SNIP_SEP + self._get_file_snippet(path_str)
+                docs.append(doc)
+                metadatas.append({
+                    "full_path": path_str, "relative_path": relative_path, "is_dir": is_dir,
+                    "size_bytes": stat.st_size, "modified_time": stat.st_mtime,
+                    "source_type": "local"
+                })
+                ids.append(f"local::{path_str}")
             if docs:
-                self.collection.upsert(documents=docs, metadatas=metadatas, ids=ids)
+                self._upsert_batch(docs, metadatas, ids)
+        self._drain_writes()
         final_count = self.collection.count()
         if self.is_cancelled:
             yield f"Build cancelled. The database now contains {final_count} items."
@@ -185,44 +332,110 @@ class SemanticExplorer:
             path_contains_filter = db_filters['relative_path']['$contains']
             del db_filters['relative_path']
 
+        query_embedding = list(self._encode_query(query.strip()))
+
+        # Metadata filters have to go through Chroma; otherwise the int8
+        # sidecar scan is much cheaper than a full fp32 ANN query.
+        if not db_filters and self.vectors.enabled and self.vectors.count() == self.collection.count():
+            return self._search_sidecar(query_embedding, n_results, path_contains_filter)
+
+        # Documents embed the path with separators replaced by spaces, so the
+        # filter can only be pushed down to Chroma when it has no separator;
+        # otherwise keep the Python post-filter and over-fetch to compensate.
+        push_down = bool(path_contains_filter) and '/' not in path_contains_filter and os.sep not in path_contains_filter
         query_params = {
-            "query_embeddings": self.model.encode([query]).tolist(),
-            "n_results": min(n_results * 5, self.collection.count())
+            "query_embeddings": [query_embedding],
+            "n_results": min(n_results * (2 if push_down else 5), self.collection.count())
         }
+        if push_down:
+            query_params["where_document"] = {"$contains": path_contains_filter}
         if db_filters:
             query_params["where"] = db_filters
-        
+
         results = self.collection.query(**query_params)
-        
+
         output = []
         if not results['ids'][0]: return []
 
         for i, dist in enumerate(results['distances'][0]):
             meta = results['metadatas'][0][i]
-            
+
             if path_contains_filter and path_contains_filter not in meta['relative_path']:
                 continue
 
-            output.append({
-                "similarity": 1 - dist,
-                "path": meta['relative_path'],
-                "full_path": meta['full_path'],
-                "type": "📁 Folder" if meta.get('is_dir', False) else "📄 File",
-                "size": meta['size_bytes'] if not meta.get('is_dir', False) else None,
-                "modified": datetime.datetime.fromtimestamp(meta['modified_time'])
-            })
-            
+            # Chroma's ip distance is 1 - dot; with unit vectors that dot is
+            # the cosine similarity, so 1 - dist recovers it.
+            output.append(self._result_entry(meta, 1 - dist))
+
+            if len(output) >= n_results:
+                break
+
+        return output
+
+    def _result_entry(self, meta: dict, similarity: float) -> dict:
+        return {
+            "similarity": similarity,
+            "path": meta['relative_path'],
+            "full_path": meta['full_path'],
+            "type": "📁 Folder" if meta.get('is_dir', False) else "📄 File",
+            "size": meta['size_bytes'] if not meta.get('is_dir', False) else None,
+            "modified": datetime.datetime.fromtimestamp(meta['modified_time'])
+        }
+
+    def _search_sidecar(self, query_embedding, n_results: int, path_contains_filter=None) -> list[dict]:
+        """Sidecar scan; the fp16 memmap usually scores candidates directly."""
+        candidate_ids, sims = self.vectors.search(query_embedding, n_results * 5)
+        if not candidate_ids: return []
+
+        if sims is not None:
+            # Already cosine-ranked from the fp16 memmap; only metadata needed.
+            records = self.collection.get(ids=candidate_ids, include=["metadatas"])
+            meta_by_id = dict(zip(records['ids'], records['metadatas']))
+            output = []
+            for uid, sim in zip(candidate_ids, sims):
+                meta = meta_by_id.get(uid)
+                if meta is None:
+                    continue
+                if path_contains_filter and path_contains_filter not in meta['relative_path']:
+                    continue
+                output.append(self._result_entry(meta, float(sim)))
+                if len(output) >= n_results:
+                    break
+            return output
+
+        # int8-only ranking: rerank with fp32 vectors fetched from Chroma.
+        records = self.collection.get(ids=candidate_ids, include=["embeddings", "metadatas"])
+        embs = np.asarray(records['embeddings'], dtype=np.float32)
+        norms = np.linalg.norm(embs, axis=1)
+        norms[norms == 0] = 1.0
+        q = np.asarray(query_embedding, dtype=np.float32)
+        q /= np.linalg.norm(q) or 1.0
+        sims = (embs / norms[:, None]) @ q
+
+        output = []
+        for i in np.argsort(sims)[::-1]:
+            meta = records['metadatas'][i]
+            if path_contains_filter and path_contains_filter not in meta['relative_path']:
+                continue
+            output.append(self._result_entry(meta, float(sims[i])))
             if len(output) >= n_results:
                 break
-                
         return output
 
     def clear_index(self) -> int:
         count = self.collection.count()
         if count > 0:
-            ids_to_delete = self.collection.get(include=[])['ids']
-            if ids_to_delete:
-                self.collection.delete(ids=ids_to_delete)
+            try:
+                self.collection.delete(where={"source_type": {"$in": ["local", "repository"]}})
+            except Exception:
+                # Older Chroma versions without where-deletes: page through ids
+                # so we never hold the whole id list in memory.
+                while True:
+                    ids_to_delete = self.collection.get(include=[], limit=10000)['ids']
+                    if not ids_to_delete:
+                        break
+                    self.collection.delete(ids=ids_to_delete)
+        self.vectors.clear()
         return count
     
     def cancel_indexing(self):
@@ -0,0 +1,61 @@
+# core/onnx_encoder.py
+import os
+import logging
+import numpy as np
+
+try:
+    from optimum.onnxruntime import ORTModelForFeatureExtraction, ORTQuantizer
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+    from transformers import AutoTokenizer
+    ONNX_AVAILABLE = True
+except ImportError:
+    ONNX_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+MODEL_NAME = 'sentence-transformers/all-MiniLM-L6-v2'
+
+
+class OnnxEncoder:
+    """
+    Query encoder backed by ONNX Runtime. A single-sentence forward pass
+    through the PyTorch model is dominated by per-op overhead; the exported
+    graph with int8 dynamic quantization cuts query latency several-fold.
+
+    The exported (and, when possible, quantized) model is cached under
+    cache_dir so the export only happens once.
+    """
+
+    def __init__(self, model_name: str = MODEL_NAME, cache_dir: str = None):
+        if not ONNX_AVAILABLE:
+            raise RuntimeError("optimum[onnxruntime] is not installed.")
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        quant_dir = os.path.join(cache_dir, "onnx_int8") if cache_dir else None
+
+        if quant_dir and os.path.isdir(quant_dir) and os.listdir(quant_dir):
+            self.model = ORTModelForFeatureExtraction.from_pretrained(quant_dir, provider='CPUExecutionProvider')
+            return
+
+        self.model = ORTModelForFeatureExtraction.from_pretrained(
+            model_name, export=True, provider='CPUExecutionProvider'
+        )
+        if quant_dir:
+            try:
+                quantizer = ORTQuantizer.from_pretrained(self.model)
+                quantizer.quantize(
+                    save_dir=quant_dir,
+                    quantization_config=AutoQuantizationConfig.avx512_vnni(is_static=False)
+                )
+                self.model = ORTModelForFeatureExtraction.from_pretrained(quant_dir, provider='CPUExecutionProvider')
+            except Exception as e:
+                logger.warning(f"int8 quantization failed, using fp32 ONNX model: {e}")
+
+    def encode(self, texts: list) -> np.ndarray:
+        """Tokenize -> ORT forward -> mean-pool -> L2-normalize, all in numpy."""
+        inputs = self.tokenizer(list(texts), padding=True, truncation=True, return_tensors='np')
+        hidden = np.asarray(self.model(**inputs).last_hidden_state)
+        mask = inputs['attention_mask'][:, :, None].astype(np.float32)
+        emb = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        norms = np.linalg.norm(emb, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return emb / norms
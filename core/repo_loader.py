@@ -1,8 +1,9 @@
 # core/repo_loader.py
 import requests
+from requests.adapters import HTTPAdapter
 import os
+import re
 from huggingface_hub import HfApi
-from pathlib import Path
 import logging
 from typing import List, Tuple, Dict, Optional
 import urllib.parse
@@ -22,14 +23,31 @@ GITHUB_TOKEN = os.getenv('GITHUB_TOKEN')
 if GITHUB_TOKEN:
     HEADERS['Authorization'] = f'token {GITHUB_TOKEN}'
 
+_session = None
+
+def get_session() -> requests.Session:
+    """Returns a shared Session with a connection pool sized for parallel fetches."""
+    global _session
+    if _session is None:
+        _session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=32, pool_maxsize=32)
+        _session.mount('https://', adapter)
+        _session.mount('http://', adapter)
+    return _session
+
+# Single compiled alternation covering directory patterns, exact filenames and
+# extensions, so filtering a large file list is one regex scan per path instead
+# of a Path construction plus several membership checks.
+_EXCLUDE_RE = re.compile(
+    '|'.join(
+        ['(?:^|/)' + re.escape(p.rstrip('/')) + '(?:/|$)' for p in EXCLUDE_PATTERNS] +
+        ['(?:^|/)' + re.escape(n.lower()) + '$' for n in EXCLUDE_FILENAMES] +
+        [re.escape(e) + '$' for e in EXCLUDE_EXTENSIONS]
+    )
+)
+
 def is_excluded(filepath: str) -> bool:
-    path = Path(filepath)
-    if path.name.lower() in EXCLUDE_FILENAMES or path.suffix.lower() in EXCLUDE_EXTENSIONS:
-        return True
-    normalized_path = path.as_posix() + '/'
-    if any(pattern in normalized_path for pattern in EXCLUDE_PATTERNS):
-        return True
-    return False
+    return _EXCLUDE_RE.search(filepath.lower().replace('\\', '/')) is not None
 
 def _get_github_files(owner: str, repo: str) -> Tuple[Optional[List[Dict]], Optional[str], Optional[str]]:
     """Fetches file list from GitHub, returns (files, default_branch, error_str)."""
@@ -49,7 +67,7 @@ def _get_github_files(owner: str, repo: str) -> Tuple[Optional[List[Dict]], Opti
         tree_response.raise_for_status()
 
         files = [
-            {"path": item['path'], "size": item.get('size', 0)}
+            {"path": item['path'], "size": item.get('size', 0), "sha": item.get('sha')}
             for item in tree_response.json()['tree']
             if item['type'] == 'blob'
         ]
@@ -65,7 +83,7 @@ def _get_hf_files(owner: str, repo: str) -> Tuple[Optional[List[Dict]], Optional
     try:
         api = HfApi(token=os.getenv('HF_TOKEN'))
         repo_info = api.repo_info(repo_id=f'{owner}/{repo}', repo_type="space")
-        files = [{"path": f.rfilename, "size": f.size} for f in repo_info.siblings if f.blob_id is not None]
+        files = [{"path": f.rfilename, "size": f.size, "sha": f.blob_id} for f in repo_info.siblings if f.blob_id is not None]
         return files, None
     except Exception as e:
         return None, f"Error fetching from Hugging Face Hub: {e}"
@@ -105,29 +123,31 @@ def get_repo_files(url: str) -> Tuple[Optional[List[Dict]], Optional[str], Optio
         logger.error(f"Error processing repo URL '{url}': {e}", exc_info=True)
         return None, None, f"An unexpected error occurred: {str(e)}"
 
-def get_remote_file_content(file_url: str, max_size=1_000_000) -> Tuple[Optional[str], Optional[str]]:
+def get_remote_file_content(file_url: str, max_size=1_000_000, session=None) -> Tuple[Optional[str], Optional[str]]:
     """
     Fetches content of a remote file. Returns (content, error_str).
-    Skips files that are too large.
+    Skips files that are too large. Uses the shared pooled session unless
+    one is passed in, so concurrent fetches reuse TCP/TLS connections.
     """
     try:
-        with requests.get(file_url, stream=True, timeout=15) as r:
+        client = session or get_session()
+        with client.get(file_url, stream=True, timeout=15) as r:
             r.raise_for_status()
             
             content_length = r.headers.get('content-length')
             if content_length and int(content_length) > max_size:
                 return None, f"File is too large ({int(content_length)/1024:.1f} KB > {max_size/1024:.1f} KB)."
 
-            content = b''
-            for chunk in r.iter_content(chunk_size=8192):
-                content += chunk
-                if len(content) > max_size:
+            buf = bytearray()
+            for chunk in r.iter_content(chunk_size=65536):
+                buf.extend(chunk)
+                if len(buf) > max_size:
                     return None, f"File is too large (exceeded {max_size/1024:.1f} KB while streaming)."
 
-            if b'\x00' in content[:1024]:
+            if b'\x00' in buf[:1024]:
                 return None, "File appears to be binary."
-            
-            return content.decode('utf-8', errors='ignore'), None
+
+            return bytes(buf).decode('utf-8', errors='ignore'), None
     except requests.RequestException as e:
         return None, f"Network error fetching file: {e}"
     except Exception as e:
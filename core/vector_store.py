@@ -0,0 +1,232 @@
+# core/vector_store.py
+import os
+import sqlite3
+import threading
+import numpy as np
+
+try:
+    from sentence_transformers.quantization import quantize_embeddings
+except ImportError:  # Older sentence-transformers without the quantization module
+    quantize_embeddings = None
+
+# Number of fp32 rows kept as the calibration sample for int8 quantization.
+CALIBRATION_SIZE = 10_000
+
+
+class Int8VectorStore:
+    """
+    SQLite-backed sidecar that keeps an int8-quantized copy of every embedding
+    in the main Chroma collection. Scanning int8 vectors is ~4x lighter on
+    memory bandwidth than fp32 and loses almost no recall, so searches run a
+    cheap int8 scan here first and rerank the survivors with full-precision
+    vectors from Chroma.
+
+    Quantization ranges come from a calibration matrix frozen on first use and
+    persisted next to the database, so stored vectors stay comparable across
+    runs.
+
+    A packed sign-bit copy of each vector (48 bytes at dim 384) backs a
+    Hamming-distance prefilter, so on larger collections only a small
+    candidate set ever sees the int8 dot product.
+
+    An fp16 copy of every embedding lives in a flat file mapped with
+    numpy.memmap, keyed by a row index stored per vector. Candidates are
+    reranked straight from the memmap, which warm-starts instantly and keeps
+    search off Chroma's embedding load path entirely.
+    """
+
+    # Never prefilter below this size; the full int8 scan is already cheap.
+    PREFILTER_MIN_ROWS = 5000
+
+    def __init__(self, db_path: str, dim: int = 384):
+        self.dim = dim
+        os.makedirs(db_path, exist_ok=True)
+        self.db_file = os.path.join(db_path, "vector_sidecar.sqlite3")
+        self.calib_file = os.path.join(db_path, "int8_calibration.npy")
+        self.conn = sqlite3.connect(self.db_file, check_same_thread=False)
+        self.f16_file = os.path.join(db_path, "embs.f16")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS vectors (unique_id TEXT PRIMARY KEY, int8 BLOB, bits BLOB, row INTEGER)"
+        )
+        for column in ("bits BLOB", "row INTEGER"):
+            try:
+                self.conn.execute(f"ALTER TABLE vectors ADD COLUMN {column}")
+            except sqlite3.OperationalError:  # Column already present
+                pass
+        self.conn.commit()
+        self._lock = threading.Lock()
+        self._calibration = np.load(self.calib_file) if os.path.exists(self.calib_file) else None
+        self._ids = None
+        self._matrix = None
+        self._bits = None
+        self._rows = None
+        self._f16 = None
+
+    @property
+    def enabled(self) -> bool:
+        return quantize_embeddings is not None
+
+    def count(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM vectors").fetchone()[0]
+
+    def _quantize(self, embs: np.ndarray) -> np.ndarray:
+        if self._calibration is None:
+            self._calibration = embs[:CALIBRATION_SIZE].astype(np.float32)
+            np.save(self.calib_file, self._calibration)
+        return quantize_embeddings(embs, precision="int8", calibration_embeddings=self._calibration)
+
+    def add(self, ids: list, embeddings) -> None:
+        """Quantizes and upserts a batch of fp32 embeddings keyed by unique_id."""
+        if not self.enabled or not ids:
+            return
+        embs = np.asarray(embeddings, dtype=np.float32)
+        int8 = self._quantize(embs)
+        bits = np.packbits(embs > 0, axis=1)
+        with self._lock:
+            rows = self._assign_rows(ids)
+            self._write_f16(rows, embs)
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO vectors (unique_id, int8, bits, row) VALUES (?, ?, ?, ?)",
+                [(uid, i8.tobytes(), b.tobytes(), row) for uid, i8, b, row in zip(ids, int8, bits, rows)]
+            )
+            self.conn.commit()
+            self._ids = None  # Invalidate the in-memory scan cache
+            self._matrix = None
+            self._bits = None
+            self._rows = None
+            self._f16 = None
+
+    def _assign_rows(self, ids: list) -> list:
+        """Reuses the memmap row for ids already stored; appends for new ones."""
+        placeholders = ','.join('?' * len(ids))
+        existing = dict(self.conn.execute(
+            f"SELECT unique_id, row FROM vectors WHERE unique_id IN ({placeholders})", ids
+        ).fetchall())
+        next_row = os.path.getsize(self.f16_file) // (self.dim * 2) if os.path.exists(self.f16_file) else 0
+        rows = []
+        for uid in ids:
+            row = existing.get(uid)
+            if row is None:
+                row = next_row
+                next_row += 1
+            rows.append(row)
+        return rows
+
+    def _write_f16(self, rows: list, embs: np.ndarray) -> None:
+        f16 = embs.astype(np.float16)
+        row_bytes = self.dim * 2
+        with open(self.f16_file, 'r+b' if os.path.exists(self.f16_file) else 'wb') as f:
+            for row, vec in zip(rows, f16):
+                f.seek(row * row_bytes)
+                f.write(vec.tobytes())
+
+    def _load(self) -> None:
+        rows = self.conn.execute("SELECT unique_id, int8, bits, row FROM vectors").fetchall()
+        self._ids = [r[0] for r in rows]
+        self._bits = None
+        self._f16 = None
+        if rows:
+            self._matrix = np.frombuffer(b''.join(r[1] for r in rows), dtype=np.int8).reshape(len(rows), self.dim)
+            # Rows written before the bits column existed disable the prefilter.
+            if all(r[2] is not None for r in rows):
+                self._bits = np.frombuffer(b''.join(r[2] for r in rows), dtype=np.uint8).reshape(len(rows), self.dim // 8)
+            if all(r[3] is not None for r in rows) and os.path.exists(self.f16_file):
+                self._rows = np.array([r[3] for r in rows], dtype=np.int64)
+                mm = np.memmap(self.f16_file, dtype=np.float16, mode='r')
+                if mm.size >= (self._rows.max() + 1) * self.dim:
+                    self._f16 = mm.reshape(-1, self.dim)
+        else:
+            self._matrix = np.empty((0, self.dim), dtype=np.int8)
+
+    def search(self, query_embedding, top_k: int):
+        """
+        Scans in up to three precisions: a Hamming prefilter over packed sign
+        bits narrows the candidates, which are then reranked from the fp16
+        memmap (cosine, zero-copy from disk). Returns (ids, similarities);
+        similarities is None when only the int8 ranking was available.
+        """
+        with self._lock:
+            if self._matrix is None:
+                self._load()
+            if not self._ids:
+                return [], None
+            q = np.asarray(query_embedding, dtype=np.float32).reshape(1, -1)
+
+            candidates = None
+            if self._bits is not None and len(self._ids) > max(self.PREFILTER_MIN_ROWS, top_k * 4):
+                q_bits = np.packbits(q[0] > 0)
+                hamming = np.unpackbits(np.bitwise_xor(self._bits, q_bits), axis=1).sum(axis=1)
+                n_pre = min(max(500, top_k * 10), len(self._ids))
+                candidates = np.argpartition(hamming, n_pre - 1)[:n_pre]
+
+            if self._f16 is not None:
+                qn = q[0] / (np.linalg.norm(q[0]) or 1.0)
+                rows = self._rows if candidates is None else self._rows[candidates]
+                sims = self._f16[rows].astype(np.float32) @ qn
+                top = np.argsort(sims)[::-1][:top_k]
+                top_sims = sims[top]
+                if candidates is not None:
+                    top = candidates[top]
+                return [self._ids[i] for i in top], top_sims.tolist()
+
+            q_int8 = self._quantize(q)[0].astype(np.int16)
+            matrix = self._matrix if candidates is None else self._matrix[candidates]
+            # int32 accumulation: a 384-dim dot of int8 values overflows int16.
+            scores = np.einsum('ij,j->i', matrix.astype(np.int16), q_int8, dtype=np.int32)
+            top = np.argsort(scores)[::-1][:top_k]
+            if candidates is not None:
+                top = candidates[top]
+            return [self._ids[i] for i in top], None
+
+    def clear(self) -> None:
+        with self._lock:
+            self.conn.execute("DELETE FROM vectors")
+            self.conn.commit()
+            if os.path.exists(self.f16_file):
+                os.remove(self.f16_file)
+            self._ids = None
+            self._matrix = None
+            self._bits = None
+            self._rows = None
+            self._f16 = None
+
+
+class RepoBlobCache:
+    """
+    Persistent cache of fetched repository documents and their embeddings,
+    keyed by unique_id and the blob SHA reported by the hosting API. When a
+    re-index sees an unchanged SHA it can re-upsert the cached document and
+    embedding without downloading or re-encoding the file.
+    """
+
+    def __init__(self, db_path: str, dim: int = 384):
+        self.dim = dim
+        os.makedirs(db_path, exist_ok=True)
+        self.db_file = os.path.join(db_path, "repo_blob_cache.sqlite3")
+        self.conn = sqlite3.connect(self.db_file, check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS blobs (unique_id TEXT PRIMARY KEY, sha TEXT, doc TEXT, emb BLOB)"
+        )
+        self.conn.commit()
+        self._lock = threading.Lock()
+
+    def get(self, unique_id: str, sha: str):
+        """Returns (doc, embedding) if the cached SHA matches, else None."""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT doc, emb FROM blobs WHERE unique_id = ? AND sha = ?", (unique_id, sha)
+            ).fetchone()
+        if row is None:
+            return None
+        return row[0], np.frombuffer(row[1], dtype=np.float32).tolist()
+
+    def put(self, ids: list, shas: list, docs: list, embeddings: list) -> None:
+        rows = [
+            (uid, sha, doc, np.asarray(emb, dtype=np.float32).tobytes())
+            for uid, sha, doc, emb in zip(ids, shas, docs, embeddings) if sha
+        ]
+        if not rows:
+            return
+        with self._lock:
+            self.conn.executemany("INSERT OR REPLACE INTO blobs VALUES (?, ?, ?, ?)", rows)
+            self.conn.commit()